@@ -1,13 +1,18 @@
 from flask import Flask, request, g
 import os
+import itertools
 import logging
-from flask_swagger_ui import get_swaggerui_blueprint
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
 import uuid
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from .utils import UploadRequest
 from core.config import (
     LOG_LEVEL, UPLOAD_ROOT, OUTPUT_ROOT, MAX_CONTENT_LENGTH, 
-    ALLOWED_EXTENSIONS, ENABLE_CLEANUP, CLEANUP_INTERVAL_SECONDS
+    ALLOWED_EXTENSIONS, ENABLE_CLEANUP, CLEANUP_INTERVAL_SECONDS,
+    ENABLE_RATE_LIMIT, ENABLE_SWAGGER_UI,
+    RATELIMIT_DEFAULTS, RATELIMIT_STORAGE_URI, RATELIMIT_STRATEGY,
+    USE_X_SENDFILE
 )
 
 # Configure logging
@@ -16,32 +21,77 @@ logging.basicConfig(
     format='%(asctime)s - [%(request_id)s] - %(name)s - %(levelname)s - %(message)s'
 )
 
+# Request ID of the request being handled; 'SYSTEM' outside of requests
+_request_id_var: ContextVar[str] = ContextVar('request_id', default='SYSTEM')
+
 class RequestIdFilter(logging.Filter):
     def filter(self, record):
         if not hasattr(record, 'request_id'):
-            try:
-                record.request_id = g.get('request_id', 'NO-REQUEST-ID')
-            except (RuntimeError, AttributeError):
-                record.request_id = 'SYSTEM'
+            record.request_id = _request_id_var.get()
         return True
 
 for handler in logging.root.handlers:
     handler.addFilter(RequestIdFilter())
 logging.getLogger().addFilter(RequestIdFilter())
 
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
+app.request_class = UploadRequest
 
-limiter = Limiter(
-    app=app,
-    key_func=get_remote_address,
-    default_limits=["2000 per hour", "1000 per minute"],
-    storage_uri="memory://",
-    strategy="fixed-window"
-)
+# Request IDs share a per-worker prefix and append a counter, so generating
+# one doesn't cost an os.urandom() call per request.
+def _reset_request_ids():
+    global _REQUEST_ID_PREFIX, _REQUEST_ID_COUNTER
+    _REQUEST_ID_PREFIX = f"{uuid.uuid4().hex[:16]}-{os.getpid()}"
+    _REQUEST_ID_COUNTER = itertools.count()
+
+
+_reset_request_ids()
+# Workers forked from a preloaded app would otherwise inherit the master's
+# prefix and counter and hand out duplicate IDs.
+os.register_at_fork(after_in_child=_reset_request_ids)
+
+class _NoopLimiter:
+    """Stand-in for flask_limiter.Limiter when rate limiting is disabled."""
+
+    def limit(self, *args, **kwargs):
+        return lambda f: f
+
+    def exempt(self, f):
+        return f
+
+
+def _create_limiter():
+    """Build the rate limiter, importing flask_limiter only when it is enabled."""
+    if not ENABLE_RATE_LIMIT:
+        return _NoopLimiter()
+
+    from flask_limiter import Limiter
+    from flask_limiter.util import get_remote_address
+
+    return Limiter(
+        app=app,
+        key_func=get_remote_address,
+        default_limits=RATELIMIT_DEFAULTS,
+        storage_uri=RATELIMIT_STORAGE_URI,
+        strategy=RATELIMIT_STRATEGY
+    )
+
+
+limiter = _create_limiter()
 
 @app.before_request
 def add_request_id():
-    g.request_id = request.headers.get('X-Request-ID', str(uuid.uuid4()))
+    request_id = request.headers.get('X-Request-ID')
+    if request_id is None:
+        request_id = f"{_REQUEST_ID_PREFIX}-{next(_REQUEST_ID_COUNTER)}"
+    g.request_id = request_id
+    _request_id_var.set(request_id)
+
+@app.teardown_request
+def clear_request_id(exc):
+    _request_id_var.set('SYSTEM')
 
 @app.after_request
 def add_request_id_header(response):
@@ -53,10 +103,22 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_ROOT
 app.config['OUTPUT_FOLDER'] = OUTPUT_ROOT
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 app.config['ALLOWED_EXTENSIONS'] = ALLOWED_EXTENSIONS
+app.config['USE_X_SENDFILE'] = USE_X_SENDFILE
+app.config['_ALLOWED_SUFFIXES'] = tuple('.' + ext for ext in ALLOWED_EXTENSIONS)
 
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
 
+# Resolved once so request handlers don't re-run realpath() per request
+app.config['OUTPUT_FOLDER_RESOLVED'] = Path(app.config['OUTPUT_FOLDER']).resolve()
+app.config['_OUTPUT_PREFIX'] = os.path.join(str(app.config['OUTPUT_FOLDER_RESOLVED']), '')
+
+# Batch temp directories (unique per request) are removed here so rmtree
+# time stays off the request path
+app.extensions['cleanup_pool'] = ThreadPoolExecutor(
+    max_workers=2, thread_name_prefix='upload-cleanup'
+)
+
 from . import routes
 
 try:
@@ -68,15 +130,25 @@ except ImportError:
 if CLEANUP_AVAILABLE and ENABLE_CLEANUP:
     try:
         start_cleanup_worker(UPLOAD_ROOT, OUTPUT_ROOT, CLEANUP_INTERVAL_SECONDS)
-        logging.info(f"Cleanup worker enabled (interval: {CLEANUP_INTERVAL_SECONDS}s)")
+        logger.info("Cleanup worker enabled (interval: %ss)", CLEANUP_INTERVAL_SECONDS)
     except Exception as e:
-        logging.error(f"Failed to start cleanup worker: {e}")
+        logger.error("Failed to start cleanup worker: %s", e)
 
 SWAGGER_URL = '/api/docs'
 API_URL = '/static/openapi.yaml' 
-swaggerui_blueprint = get_swaggerui_blueprint(
-    SWAGGER_URL,
-    API_URL,
-    config={'app_name': "Figure Extractor API"}
-)
-app.register_blueprint(swaggerui_blueprint, url_prefix=SWAGGER_URL)
+
+
+def _register_swagger_ui():
+    """Mount the Swagger UI blueprint, importing flask_swagger_ui only when enabled."""
+    from flask_swagger_ui import get_swaggerui_blueprint
+
+    swaggerui_blueprint = get_swaggerui_blueprint(
+        SWAGGER_URL,
+        API_URL,
+        config={'app_name': "Figure Extractor API"}
+    )
+    app.register_blueprint(swaggerui_blueprint, url_prefix=SWAGGER_URL)
+
+
+if ENABLE_SWAGGER_UI:
+    _register_swagger_ui()
@@ -3,15 +3,100 @@
 This module provides automated cleanup of old files from upload and output
 directories to prevent disk space exhaustion.
 """
+import os
+import sys
 import time
+import atexit
+import shutil
 import logging
+import threading
+import subprocess
 from pathlib import Path
-from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Set to stop the background cleanup loop (also set at interpreter exit)
+_stop_event = threading.Event()
+atexit.register(_stop_event.set)
+
+# Only one cleanup thread per process, even if the app module is imported twice
+_worker_lock = threading.Lock()
+_worker_thread = None
+
+
+def _delete_old_files_with_find(directory: Path, max_age_hours: int):
+    """Delete old files with a single GNU find process.
+    
+    Keeps the per-file stat/unlink loop out of the interpreter on large
+    directories.
+    
+    Returns:
+        Tuple of (deleted_count, deleted_size_bytes), or None if find is
+        unavailable or does not support -printf (e.g. BSD find)
+    """
+    find = shutil.which('find')
+    if find is None:
+        return None
+    
+    command = [
+        find, str(directory),
+        '-maxdepth', '1',
+        '-type', 'f',
+        '-mmin', f'+{max_age_hours * 60}',
+        # -delete first so a size is printed only after a successful unlink
+        '-delete',
+        '-printf', '%s\n',
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True)
+    except OSError as e:
+        logger.debug("find unavailable for cleanup: %s", e)
+        return None
+    
+    sizes = result.stdout.split()
+    if result.returncode != 0:
+        if not sizes:
+            logger.debug("find cleanup failed, falling back to scandir: %s", result.stderr.strip())
+            return None
+        logger.error("Failed to delete some files in %s: %s", directory, result.stderr.strip())
+    
+    return len(sizes), sum(int(size) for size in sizes)
+
+
+def _delete_old_files_with_scandir(directory: Path, max_age_hours: int):
+    """Delete old files by walking the directory with os.scandir.
+    
+    Returns:
+        Tuple of (deleted_count, deleted_size_bytes)
+    """
+    cutoff_ts = time.time() - max_age_hours * 3600
+    deleted_count = 0
+    deleted_size = 0
+    log_deletions = logger.isEnabledFor(logging.DEBUG)
+    
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            try:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                st = entry.stat(follow_symlinks=False)
+                if st.st_mtime < cutoff_ts:
+                    os.unlink(entry.path)
+                    deleted_count += 1
+                    deleted_size += st.st_size
+                    if log_deletions:
+                        logger.debug("Deleted old file: %s", entry.path)
+            except Exception as file_error:
+                logger.error("Failed to delete %s: %s", entry.path, file_error)
+    
+    return deleted_count, deleted_size
 
 
 def cleanup_old_files(directory: Path, max_age_hours: int = 24):
     """Remove files older than max_age_hours.
     
+    Uses GNU find on Linux and falls back to an os.scandir loop elsewhere.
+    
     Args:
         directory: Directory to clean
         max_age_hours: Maximum age of files in hours
@@ -20,38 +105,28 @@ def cleanup_old_files(directory: Path, max_age_hours: int = 24):
         Tuple of (deleted_count, deleted_size_mb)
     """
     if not directory.exists():
-        logging.warning(f"Cleanup skipped: directory does not exist: {directory}")
+        logger.warning("Cleanup skipped: directory does not exist: %s", directory)
         return 0, 0
-        
-    cutoff_time = datetime.now() - timedelta(hours=max_age_hours)
-    deleted_count = 0
-    deleted_size = 0
     
     try:
-        for file_path in directory.iterdir():
-            if file_path.is_file():
-                try:
-                    file_mtime = datetime.fromtimestamp(file_path.stat().st_mtime)
-                    if file_mtime < cutoff_time:
-                        file_size = file_path.stat().st_size
-                        file_path.unlink()
-                        deleted_count += 1
-                        deleted_size += file_size
-                        logging.debug(f"Deleted old file: {file_path}")
-                except Exception as file_error:
-                    logging.error(f"Failed to delete {file_path}: {file_error}")
+        deleted = None
+        if sys.platform.startswith('linux'):
+            deleted = _delete_old_files_with_find(directory, max_age_hours)
+        if deleted is None:
+            deleted = _delete_old_files_with_scandir(directory, max_age_hours)
+        deleted_count, deleted_size = deleted
         
         if deleted_count > 0:
             size_mb = deleted_size / (1024 * 1024)
-            logging.info(f"Cleanup: Deleted {deleted_count} files ({size_mb:.2f} MB) from {directory}")
+            logger.info("Cleanup: Deleted %s files (%.2f MB) from %s", deleted_count, size_mb, directory)
         else:
-            logging.debug(f"Cleanup: No old files to delete in {directory}")
+            logger.debug("Cleanup: No old files to delete in %s", directory)
             
         return deleted_count, deleted_size / (1024 * 1024)
             
     except Exception as e:
-        logging.error(f"Cleanup failed for {directory}: {e}")
-        return deleted_count, deleted_size / (1024 * 1024)
+        logger.error("Cleanup failed for %s: %s", directory, e)
+        return 0, 0
 
 
 def start_cleanup_worker(upload_dir: str, output_dir: str, interval_seconds: int = 3600):
@@ -62,15 +137,13 @@ def start_cleanup_worker(upload_dir: str, output_dir: str, interval_seconds: int
         output_dir: Output directory path
         interval_seconds: Cleanup interval in seconds (default 1 hour)
     """
-    import threading
-    
     def cleanup_loop():
         """Main cleanup loop running in background thread."""
-        logging.info(f"Cleanup worker started (interval: {interval_seconds}s)")
+        logger.info("Cleanup worker started (interval: %ss)", interval_seconds)
         
-        while True:
+        while not _stop_event.is_set():
             try:
-                logging.info("Running scheduled cleanup...")
+                logger.info("Running scheduled cleanup...")
                 
                 # Clean uploads (keep for 24 hours)
                 upload_count, upload_mb = cleanup_old_files(Path(upload_dir), max_age_hours=24)
@@ -82,22 +155,38 @@ def start_cleanup_worker(upload_dir: str, output_dir: str, interval_seconds: int
                 total_mb = upload_mb + output_mb
                 
                 if total_count > 0:
-                    logging.info(
-                        f"Cleanup complete: Removed {total_count} files "
-                        f"({total_mb:.2f} MB total). Next cleanup in {interval_seconds}s"
+                    logger.info(
+                        "Cleanup complete: Removed %s files (%.2f MB total). Next cleanup in %ss",
+                        total_count, total_mb, interval_seconds
                     )
                 else:
-                    logging.debug(f"Cleanup complete: No files to remove. Next cleanup in {interval_seconds}s")
+                    logger.debug("Cleanup complete: No files to remove. Next cleanup in %ss", interval_seconds)
                     
             except Exception as e:
-                logging.error(f"Cleanup worker error: {e}")
+                logger.error("Cleanup worker error: %s", e)
             
-            time.sleep(interval_seconds)
+            if _stop_event.wait(interval_seconds):
+                break
+        
+        logger.info("Cleanup worker stopped")
     
-    # Start daemon thread (will exit when main program exits)
-    cleanup_thread = threading.Thread(target=cleanup_loop, daemon=True)
-    cleanup_thread.start()
-    logging.info("Cleanup worker thread initialized")
+    global _worker_thread
+    with _worker_lock:
+        if _worker_thread is not None and _worker_thread.is_alive():
+            logger.debug("Cleanup worker already running")
+            return
+        
+        # A previous stop_cleanup_worker() leaves the event set
+        _stop_event.clear()
+        # Start daemon thread (will exit when main program exits)
+        _worker_thread = threading.Thread(target=cleanup_loop, daemon=True)
+        _worker_thread.start()
+    logger.info("Cleanup worker thread initialized")
+
+
+def stop_cleanup_worker():
+    """Signal the background cleanup worker to exit at its next wakeup."""
+    _stop_event.set()
 
 
 def cleanup_directory_now(directory: Path, max_age_hours: int = 0):
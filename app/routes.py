@@ -1,20 +1,60 @@
-from flask import request, jsonify, send_from_directory, g
+from flask import request, send_from_directory, g
 from . import app, limiter
 from .utils import (
     save_uploaded_file, save_and_extract_zip,
-    error_response, success_response, validate_pdf_file, 
+    error_response, success_response, json_response, validate_pdf_file, 
     ERROR_CODES
 )
-from .service import run_pdffigures2, count_figures_and_tables, run_pdffigures2_batch
+from .service import run_pdffigures2, run_pdffigures2_batch
+from core.config import (
+    PDF_FIGURES2_JAR, DOWNLOAD_MAX_AGE_SECONDS, DOWNLOAD_ACCEL_REDIRECT_PREFIX
+)
+import os
+import time
 import logging
+import mimetypes
 import shutil
 from pathlib import Path
+from urllib.parse import quote
+from werkzeug.exceptions import NotFound
+
+logger = logging.getLogger(__name__)
+
+
+def _remove_file(path: Path) -> None:
+    try:
+        path.unlink(missing_ok=True)
+        logger.debug("Cleaned up uploaded file: %s", path)
+    except Exception as cleanup_error:
+        logger.error("Failed to cleanup %s: %s", path, cleanup_error)
+
+
+def _remove_tree(path: Path) -> None:
+    try:
+        shutil.rmtree(path)
+        logger.debug("Cleaned up temp directory: %s", path)
+    except FileNotFoundError:
+        pass
+    except Exception as cleanup_error:
+        logger.error("Failed to cleanup %s: %s", path, cleanup_error)
 
 
 def allowed_file(filename: str) -> bool:
     """Check if the uploaded file has an allowed extension."""
-    allowed = app.config['ALLOWED_EXTENSIONS']
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed
+    return filename.lower().endswith(app.config['_ALLOWED_SUFFIXES'])
+
+
+def _reject_oversized_request():
+    """Return a 413 response if the declared body size exceeds MAX_CONTENT_LENGTH."""
+    content_length = request.content_length
+    max_size = app.config['MAX_CONTENT_LENGTH']
+    if content_length is not None and content_length > max_size:
+        return error_response(
+            f"Request too large: {content_length} bytes (max: {max_size})",
+            error_code=ERROR_CODES['FILE_TOO_LARGE'],
+            status_code=413
+        )
+    return None
 
 
 @app.route('/extract', methods=['POST'])
@@ -27,6 +67,11 @@ def extract_figures():
     Returns:
         JSON response with extraction results or error message
     """
+    # Reject oversized uploads before any of the body is read
+    oversized = _reject_oversized_request()
+    if oversized:
+        return oversized
+
     # Validate file presence
     if 'file' not in request.files:
         return error_response(
@@ -50,13 +95,12 @@ def extract_figures():
     try:
         # Save with sanitized filename
         file_path = save_uploaded_file(file)
-        output_dir = Path(app.config['OUTPUT_FOLDER'])
-        output_dir.mkdir(parents=True, exist_ok=True)
+        output_dir = app.config['OUTPUT_FOLDER_RESOLVED']
 
         # run_pdffigures2 now raises on error and returns a summary dict
         result = run_pdffigures2(file_path, output_dir)
         
-        logging.info(f"Successfully extracted figures from {file.filename}")
+        logger.info("Successfully extracted figures from %s", file.filename)
 
         # Build response data
         data = {
@@ -77,7 +121,7 @@ def extract_figures():
         )
         
     except Exception as e:
-        logging.error(f"Error executing pdffigures2: {e}")
+        logger.error("Error executing pdffigures2: %s", e)
         return error_response(
             f"Failed to extract figures: {str(e)}",
             error_code=ERROR_CODES['PROCESSING_ERROR'],
@@ -85,13 +129,11 @@ def extract_figures():
         )
         
     finally:
-        # CRITICAL: Clean up uploaded file to prevent disk space exhaustion
-        if file_path and file_path.exists():
-            try:
-                file_path.unlink()
-                logging.debug(f"Cleaned up uploaded file: {file_path}")
-            except Exception as cleanup_error:
-                logging.error(f"Failed to cleanup {file_path}: {cleanup_error}")
+        # CRITICAL: Clean up uploaded file to prevent disk space exhaustion.
+        # Done inline: uploads are stored under the client's filename, so a
+        # deferred unlink could remove the next same-named upload mid-run.
+        if file_path:
+            _remove_file(file_path)
 
 
 @app.route('/extract_batch', methods=['POST'])
@@ -104,7 +146,12 @@ def extract_batch():
     Returns:
         JSON response with extraction results for all PDFs or error message
     """
-    logging.info("Starting batch extraction route")
+    logger.info("Starting batch extraction route")
+    
+    # Reject oversized uploads before any of the body is read
+    oversized = _reject_oversized_request()
+    if oversized:
+        return oversized
     
     # Validate file presence
     if 'folder' not in request.files:
@@ -133,18 +180,17 @@ def extract_batch():
 
     if folder:
         temp_dir = None
-        logging.debug(f"Received folder: {folder.filename}")
+        logger.debug("Received folder: %s", folder.filename)
         try:
             temp_dir = save_and_extract_zip(folder)
-            logging.debug(f"Extracted zip to directory: {temp_dir}")
+            logger.debug("Extracted zip to directory: %s", temp_dir)
             
-            output_dir = Path(app.config['OUTPUT_FOLDER'])
-            output_dir.mkdir(parents=True, exist_ok=True)
+            output_dir = app.config['OUTPUT_FOLDER_RESOLVED']
 
-            logging.info(f"Processing batch directory: {temp_dir}")
+            logger.info("Processing batch directory: %s", temp_dir)
 
             result = run_pdffigures2_batch(temp_dir, output_dir)
-            logging.info(f"Batch extraction completed successfully")
+            logger.info("Batch extraction completed successfully")
 
             return success_response(
                 data=result,
@@ -152,7 +198,7 @@ def extract_batch():
             )
         
         except Exception as e:
-            logging.error(f"Batch extraction error: {str(e)}")
+            logger.error("Batch extraction error: %s", e)
             return error_response(
                 f"Batch extraction failed: {str(e)}",
                 error_code=ERROR_CODES['PROCESSING_ERROR'],
@@ -160,12 +206,10 @@ def extract_batch():
             )
         
         finally:
-            if temp_dir and temp_dir.exists():
-                try:
-                    shutil.rmtree(temp_dir)
-                    logging.debug(f"Cleaned up temp directory: {temp_dir}")
-                except Exception as cleanup_error:
-                    logging.error(f"Failed to cleanup {temp_dir}: {cleanup_error}")
+            # temp_dir comes from mkdtemp(), so removing it later can't
+            # touch another request's files
+            if temp_dir:
+                app.extensions['cleanup_pool'].submit(_remove_tree, temp_dir)
 
 
 @app.route('/download/<filename>', methods=['GET'])
@@ -182,28 +226,58 @@ def download_file(filename):
         File download response or error
     """
     try:
-        directory = Path(app.config['OUTPUT_FOLDER'])
-        file_path = directory / filename
+        directory = app.config['OUTPUT_FOLDER_RESOLVED']
+        output_prefix = app.config['_OUTPUT_PREFIX']
+        file_path = os.path.normpath(os.path.join(output_prefix, filename))
         
-        # Security: prevent directory traversal
-        if not file_path.resolve().is_relative_to(directory.resolve()):
+        # Security: prevent directory traversal. The output directory is
+        # already resolved, so a lexical check avoids realpath() per request.
+        if not file_path.startswith(output_prefix):
             return error_response(
                 "Invalid filename",
                 error_code=ERROR_CODES['VALIDATION_ERROR'],
                 status_code=400
             )
         
-        if not file_path.exists():
-            return error_response(
-                f"File not found: {filename}",
-                error_code=ERROR_CODES['FILE_NOT_FOUND'],
-                status_code=404
+        # Let the front proxy stream the file with sendfile(2); the worker
+        # only returns headers. nginx would answer a missing file with its own
+        # HTML 404, so check here to keep the JSON FILE_NOT_FOUND error.
+        if DOWNLOAD_ACCEL_REDIRECT_PREFIX:
+            if not os.path.isfile(file_path):
+                return error_response(
+                    f"File not found: {filename}",
+                    error_code=ERROR_CODES['FILE_NOT_FOUND'],
+                    status_code=404
+                )
+            response = app.response_class(status=200)
+            response.headers['X-Accel-Redirect'] = DOWNLOAD_ACCEL_REDIRECT_PREFIX + quote(filename)
+            response.headers['Content-Type'] = (
+                mimetypes.guess_type(filename)[0] or 'application/octet-stream'
             )
+            return response
         
-        return send_from_directory(str(directory), filename)
+        # Artifacts are overwritten when a PDF of the same name is
+        # re-extracted, so clients revalidate with If-None-Match and get a
+        # bodyless 304 while the file is unchanged.
+        # send_from_directory raises NotFound itself, so there is no
+        # separate exists() probe before it opens the file.
+        return send_from_directory(
+            str(directory),
+            filename,
+            max_age=DOWNLOAD_MAX_AGE_SECONDS,
+            conditional=True,
+            etag=True,
+        )
+    
+    except NotFound:
+        return error_response(
+            f"File not found: {filename}",
+            error_code=ERROR_CODES['FILE_NOT_FOUND'],
+            status_code=404
+        )
         
     except Exception as e:
-        logging.error(f"Download error: {e}")
+        logger.error("Download error: %s", e)
         return error_response(
             "Failed to download file",
             error_code=ERROR_CODES['INTERNAL_ERROR'],
@@ -211,6 +285,10 @@ def download_file(filename):
         )
 
 
+# Health probes return a constant body, so serialize it once
+_HEALTH_BODY = b'{"service":"figure-extractor","status":"healthy","version":"1.0.0"}\n'
+
+
 @app.route('/health', methods=['GET'])
 @limiter.exempt
 def health():
@@ -221,13 +299,36 @@ def health():
     Returns:
         JSON with status and HTTP 200 if healthy
     """
-    import time
-    return jsonify({
-        "status": "healthy",
-        "service": "figure-extractor",
-        "version": "1.0.0",
-        "timestamp": time.time()
-    }), 200
+    # A fresh response per probe: after_request adds per-request headers
+    return app.response_class(_HEALTH_BODY, status=200, mimetype='application/json')
+
+
+# Readiness probes run every few seconds. The JAR cannot disappear from an
+# immutable container once found, and directory permissions are re-checked
+# at most once per TTL.
+_READY_CACHE_TTL_SECONDS = 60
+_jar_found = False
+_writable_cache = {}
+
+
+def _pdffigures2_jar_exists() -> bool:
+    """Check for the pdffigures2 JAR, caching a positive result."""
+    global _jar_found
+    if not _jar_found:
+        _jar_found = Path(PDF_FIGURES2_JAR).exists()
+    return _jar_found
+
+
+def _dir_writable(path: str) -> bool:
+    """Check that a directory exists and is writable, cached for the TTL."""
+    now = time.monotonic()
+    cached = _writable_cache.get(path)
+    if cached is not None and now - cached[0] < _READY_CACHE_TTL_SECONDS:
+        return cached[1]
+    # os.access() is False for a missing path, so no separate exists() probe
+    writable = os.access(path, os.W_OK)
+    _writable_cache[path] = (now, writable)
+    return writable
 
 
 @app.route('/ready', methods=['GET'])
@@ -240,9 +341,6 @@ def readiness():
     Returns:
         JSON with status and HTTP 200 if ready, 503 if not ready
     """
-    import os
-    import time
-    
     checks = {
         "pdffigures2_jar": False,
         "output_dir_writable": False,
@@ -251,40 +349,36 @@ def readiness():
     
     try:
         # Check if pdffigures2 JAR exists
-        from core.config import PDF_FIGURES2_JAR
-        jar_path = Path(PDF_FIGURES2_JAR)
-        checks["pdffigures2_jar"] = jar_path.exists()
+        checks["pdffigures2_jar"] = _pdffigures2_jar_exists()
         
         # Check output directory is writable
-        output_dir = Path(app.config['OUTPUT_FOLDER'])
-        checks["output_dir_writable"] = output_dir.exists() and os.access(output_dir, os.W_OK)
+        checks["output_dir_writable"] = _dir_writable(app.config['OUTPUT_FOLDER'])
         
         # Check upload directory is writable
-        upload_dir = Path(app.config['UPLOAD_FOLDER'])
-        checks["upload_dir_writable"] = upload_dir.exists() and os.access(upload_dir, os.W_OK)
+        checks["upload_dir_writable"] = _dir_writable(app.config['UPLOAD_FOLDER'])
         
         # All checks must pass
         if all(checks.values()):
-            return jsonify({
+            return json_response({
                 "status": "ready",
                 "checks": checks,
                 "timestamp": time.time()
-            }), 200
+            }, 200)
         else:
-            return jsonify({
+            return json_response({
                 "status": "not_ready",
                 "checks": checks,
                 "timestamp": time.time()
-            }), 503
+            }, 503)
             
     except Exception as e:
-        logging.error(f"Readiness check failed: {e}")
-        return jsonify({
+        logger.error("Readiness check failed: %s", e)
+        return json_response({
             "status": "error",
             "error": str(e),
             "checks": checks,
             "timestamp": time.time()
-        }), 503
+        }, 503)
 
 
 # Custom error handler for rate limiting
@@ -1,23 +1,105 @@
 # Service layer for running pdffigures2 and parsing output
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Any, Union
-from core.extractor import run_pdffigures2 as core_run_pdffigures2
-from core.extractor import run_pdffigures2_batch as core_run_pdffigures2_batch
+from typing import List, Dict, Any, Optional, Tuple, Union
+from core.config import RESULT_CACHE_SIZE
 
 logger = logging.getLogger(__name__)
 
+# Single-PDF summaries keyed by (SHA-256 of the PDF contents, filename stem),
+# stored with the (mtime_ns, size) of each artifact they reference (LRU order)
+_result_cache: "OrderedDict[Tuple[str, str], Tuple[Dict[str, Any], Dict[str, Tuple[int, int]]]]" = OrderedDict()
+_result_cache_lock = threading.Lock()
+
+@lru_cache(maxsize=None)
+def _core_extractor():
+    """Import core.extractor on first use, so probe-only workers never load it."""
+    from core import extractor
+    return extractor
+
+def _file_sha256(file_path: Union[str, Path]) -> str:
+    """Hash a file in 1 MiB chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _artifact_signature(summary: Dict[str, Any], output_dir: Path) -> Optional[Dict[str, Tuple[int, int]]]:
+    """Return (mtime_ns, size) for the metadata and images a summary references.
+
+    Returns None if any of them is missing. pdffigures2 names its outputs
+    after the upload's filename stem, so a later upload of the same name
+    overwrites them; comparing signatures detects that.
+    """
+    names = [summary.get('metadata_filename')]
+    names.extend(item.get('renderURL') for item in summary.get('figures', []))
+    names.extend(item.get('renderURL') for item in summary.get('tables', []))
+    signature = {}
+    for name in names:
+        if not name:
+            return None
+        try:
+            st = (output_dir / name).stat()
+        except OSError:
+            return None
+        signature[name] = (st.st_mtime_ns, st.st_size)
+    return signature
+
 def run_pdffigures2(file_path: Union[str, Path], output_dir: Union[str, Path]) -> Dict[str, Any]:
-    """Run pdffigures2 on a single PDF and return parsed metadata."""
-    return core_run_pdffigures2(file_path, output_dir)
+    """Run pdffigures2 on a single PDF and return parsed metadata.
+
+    Results are cached by PDF content hash and filename stem, so re-submitting
+    the same paper skips the JVM while the artifacts it produced are still
+    in output_dir unchanged.
+    """
+    if RESULT_CACHE_SIZE <= 0:
+        return _core_extractor().run_pdffigures2(file_path, output_dir)
+
+    output_dir = Path(output_dir)
+    key = (_file_sha256(file_path), Path(file_path).stem)
+
+    with _result_cache_lock:
+        cached = _result_cache.get(key)
+        if cached is not None:
+            _result_cache.move_to_end(key)
+
+    if cached is not None:
+        summary, signature = cached
+        if _artifact_signature(summary, output_dir) == signature:
+            logger.info("Using cached extraction for %s (sha256 %s)", Path(file_path).name, key[0])
+            return dict(summary)
+
+    result = _core_extractor().run_pdffigures2(file_path, output_dir)
+    if "error" not in result:
+        signature = _artifact_signature(result, output_dir)
+        if signature is not None:
+            with _result_cache_lock:
+                _result_cache[key] = (result, signature)
+                _result_cache.move_to_end(key)
+                while len(_result_cache) > RESULT_CACHE_SIZE:
+                    _result_cache.popitem(last=False)
+    return result
 
 def run_pdffigures2_batch(folder_path: Union[str, Path], output_dir: Union[str, Path]) -> List[Dict[str, Any]]:
     """Run pdffigures2 batch processing on a directory of PDFs."""
-    return core_run_pdffigures2_batch(folder_path, output_dir)
+    return _core_extractor().run_pdffigures2_batch(folder_path, output_dir)
 
 def count_figures_and_tables(figures: List[Dict[str, Any]]):
     """Count unique tables and figures based on renderURL and figType."""
-    render_urls = {fig.get('renderURL') for fig in figures if fig.get('figType') == 'Table'}
-    num_tables = len(render_urls)
-    num_figures = sum(1 for fig in figures if fig.get('figType') == 'Figure')
-    return num_tables, num_figures
+    table_urls = set()
+    add_table_url = table_urls.add
+    num_figures = 0
+    for fig in figures:
+        fig_type = fig.get('figType')
+        if fig_type == 'Table':
+            render_url = fig.get('renderURL')
+            if render_url is not None:
+                add_table_url(render_url)
+        elif fig_type == 'Figure':
+            num_figures += 1
+    return len(table_urls), num_figures
@@ -1,13 +1,22 @@
 from werkzeug.utils import secure_filename
 import os
 import json
+import shutil
 import tempfile
 import zipfile
 import logging
 from pathlib import Path
-from flask import current_app, jsonify, request
+from functools import lru_cache
+from flask import current_app, request, g, Request
 import uuid
-from datetime import datetime
+import time
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - fall back to the stdlib encoder
+    orjson = None
+
+logger = logging.getLogger(__name__)
 
 # Error codes for standardized responses
 ERROR_CODES = {
@@ -20,9 +29,69 @@ ERROR_CODES = {
     'INTERNAL_ERROR': 'INTERNAL_ERROR',
 }
 
+class UploadRequest(Request):
+    """Request that spools file uploads straight into the upload folder.
+    
+    Werkzeug normally buffers each file part in an anonymous temporary file
+    that save_uploaded_file() then copies out. Spooling into UPLOAD_FOLDER
+    lets it move the file into place with a rename instead. Spool files that
+    were not moved are removed when the request is closed.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        stream = tempfile.NamedTemporaryFile(
+            'wb+',
+            dir=current_app.config['UPLOAD_FOLDER'],
+            prefix='.upload-',
+            suffix='.part',
+            delete=False,
+        )
+        if not hasattr(self, '_spool_paths'):
+            self._spool_paths = []
+        self._spool_paths.append(stream.name)
+        return stream
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            for path in getattr(self, '_spool_paths', ()):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+# Copy buffer for uploads and zip members (the werkzeug default is 16 KiB,
+# shutil's 64 KiB)
+COPY_BUFFER_SIZE = 1024 * 1024
+
 def get_request_id():
-    """Get or generate request ID for tracking."""
-    return request.headers.get('X-Request-ID', str(uuid.uuid4()))
+    """Get the request ID assigned by the before_request hook.
+    
+    Falls back to the client header (or a fresh UUID) outside that hook, so
+    the ID in the response body matches the X-Request-ID response header.
+    """
+    request_id = g.get('request_id')
+    if request_id is None:
+        request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+    return request_id
+
+def _iso_now():
+    """Current UTC time as ISO 8601 with microseconds and a 'Z' suffix."""
+    seconds, nanos = divmod(time.time_ns(), 1_000_000_000)
+    return f"{time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(seconds))}.{nanos // 1000:06d}Z"
+
+def json_response(payload, status_code=200):
+    """Serialize payload into a JSON response, with orjson when installed."""
+    if orjson is not None:
+        body = orjson.dumps(payload)
+    else:
+        body = json.dumps(payload, separators=(',', ':'))
+    return current_app.response_class(
+        body,
+        status=status_code,
+        mimetype='application/json'
+    )
 
 def error_response(message, error_code=None, status_code=400, details=None):
     """Create a standardized error response."""
@@ -34,12 +103,12 @@ def error_response(message, error_code=None, status_code=400, details=None):
             'code': error_code or ERROR_CODES['INTERNAL_ERROR'],
         },
         'request_id': request_id,
-        'timestamp': datetime.utcnow().isoformat() + 'Z'
+        'timestamp': _iso_now()
     }
     if details:
         response['error']['details'] = details
-    logging.error(f"[{request_id}] Error: {message} (code: {error_code})")
-    return jsonify(response), status_code
+    logger.error("[%s] Error: %s (code: %s)", request_id, message, error_code)
+    return json_response(response, status_code)
 
 def success_response(data=None, message=None, status_code=200):
     """Create a standardized success response."""
@@ -47,13 +116,13 @@ def success_response(data=None, message=None, status_code=200):
     response = {
         'success': True,
         'request_id': request_id,
-        'timestamp': datetime.utcnow().isoformat() + 'Z'
+        'timestamp': _iso_now()
     }
     if data is not None:
         response['data'] = data
     if message:
         response['message'] = message
-    return jsonify(response), status_code
+    return json_response(response, status_code)
 
 def validate_pdf_file(file):
     """Validate uploaded file is a valid PDF."""
@@ -66,41 +135,68 @@ def validate_pdf_file(file):
     if not filename.lower().endswith('.pdf'):
         return False, f"Invalid file type. Expected PDF, got: {filename}"
     
-    file.seek(0)
+    # Werkzeug rewinds parsed file parts, so the header is read from offset 0.
+    # No separate size check: the whole request body, this part included,
+    # is already capped at MAX_CONTENT_LENGTH before the form is parsed.
     header = file.read(5)
     file.seek(0)
     if not header.startswith(b'%PDF-'):
         return False, "File is not a valid PDF (invalid magic bytes)"
     
-    file.seek(0, os.SEEK_END)
-    file_size = file.tell()
-    file.seek(0)
-    
-    max_size = current_app.config.get('MAX_CONTENT_LENGTH', 64 * 1024 * 1024)
-    if file_size > max_size:
-        return False, f"File too large: {file_size} bytes (max: {max_size})"
-    
     return True, None
 
+@lru_cache(maxsize=4)
+def _upload_root(app) -> Path:
+    """Return the app's upload folder, creating it on first use only."""
+    upload_root = Path(app.config['UPLOAD_FOLDER'])
+    upload_root.mkdir(parents=True, exist_ok=True)
+    return upload_root
+
 def save_uploaded_file(file):
     """Save an uploaded file to the configured upload folder."""
-    upload_root = Path(current_app.config['UPLOAD_FOLDER'])
-    upload_root.mkdir(parents=True, exist_ok=True)
+    upload_root = _upload_root(current_app._get_current_object())
     filename = secure_filename(file.filename)
     file_path = upload_root / filename
-    file.save(str(file_path))
+    
+    # Uploads spooled by UploadRequest are already on disk next to the target
+    spool_path = getattr(file.stream, 'name', None)
+    if isinstance(spool_path, str) and os.path.isfile(spool_path):
+        file.stream.flush()
+        if Path(spool_path).parent == upload_root:
+            try:
+                os.replace(spool_path, file_path)
+                return file_path
+            except OSError as e:
+                logger.debug("Could not move spooled upload %s, copying instead: %s", spool_path, e)
+        # shutil.copyfile copies file-to-file in the kernel (sendfile on Linux)
+        shutil.copyfile(spool_path, file_path)
+        return file_path
+    
+    file.save(str(file_path), buffer_size=COPY_BUFFER_SIZE)
     return file_path
 
 def save_and_extract_zip(folder):
-    """Saves and extracts a zip file to a temporary directory."""
-    temp_dir = Path(tempfile.mkdtemp())
-    zip_path = temp_dir / secure_filename(folder.filename)
-    folder.save(str(zip_path))
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        zip_ref.extractall(temp_dir)
+    """Extracts the PDFs from an uploaded zip file into a temporary directory.
     
-    # Clean up the zip file itself after extraction
-    if zip_path.exists():
-        zip_path.unlink()
-        
+    The archive is read straight from the upload stream (already spooled to
+    disk by UploadRequest), so it is not copied a second time before extraction.
+    Only PDF members are written, since pdffigures2 ignores everything else.
+    """
+    temp_dir = Path(tempfile.mkdtemp())
+    root = temp_dir.resolve()
+    folder.stream.seek(0)
+    with zipfile.ZipFile(folder.stream, 'r') as zip_ref:
+        for info in zip_ref.infolist():
+            if info.is_dir() or not info.filename.lower().endswith('.pdf'):
+                continue
+            
+            # Security: prevent zip members from escaping the temp directory
+            target = (root / info.filename).resolve()
+            if not target.is_relative_to(root):
+                logger.warning("Skipping unsafe zip member: %s", info.filename)
+                continue
+            
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with zip_ref.open(info) as src, open(target, 'wb') as dst:
+                shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
     return temp_dir
@@ -9,15 +9,48 @@ PDF_FIGURES2_JAR = os.getenv('PDFFIGURES2_JAR', str(BASE_DIR / 'pdffigures2' / '
 PDF_FIGURES2_CWD = os.getenv('PDF_FIGURES2_CWD', str(BASE_DIR / 'pdffigures2'))
 DEFAULT_DPI = os.getenv('PDFFIGURES2_DPI', '300')
 JAVA_OPTS = os.getenv('JAVA_OPTS', '-Xmx2g')
+# Extra JVM flags per mode: short single-file runs skip GC threads, long
+# batch runs use the throughput collector. GC flags here are dropped when
+# JAVA_OPTS already selects a collector.
+PDFFIGURES2_SINGLE_JAVA_OPTS = os.getenv('PDFFIGURES2_SINGLE_JAVA_OPTS', '-XX:+UseSerialGC').split()
+PDFFIGURES2_BATCH_JAVA_OPTS = os.getenv('PDFFIGURES2_BATCH_JAVA_OPTS', '-XX:+UseParallelGC').split()
+# Force the KCMS colour module (only exists on JDK 8; faster there than LCMS)
+PDFFIGURES2_LEGACY_CMM = os.getenv('PDFFIGURES2_LEGACY_CMM', 'false').lower() == 'true'
+# Optional AppCDS archive for the pdffigures2 JVM (used only if the file exists)
+PDFFIGURES2_CDS_ARCHIVE = os.getenv('PDFFIGURES2_CDS_ARCHIVE', '')
 PDFFIGURES2_TIMEOUT = int(os.getenv('PDFFIGURES2_TIMEOUT_SECONDS', '300'))
+# Max pdffigures2 JVMs a process runs at once (requests and batch shards)
+PDFFIGURES2_CONCURRENCY = max(1, int(os.getenv('PDFFIGURES2_CONCURRENCY', str(os.cpu_count() or 1))))
+# Number of concurrent JVMs a batch is sharded across (1 = single JVM)
+PDFFIGURES2_BATCH_WORKERS = max(1, int(os.getenv('PDFFIGURES2_BATCH_WORKERS', '1')))
 
 # Flask app configuration
 UPLOAD_ROOT = os.getenv('UPLOAD_DIR', str(BASE_DIR / 'uploads'))
 OUTPUT_ROOT = os.getenv('OUTPUT_DIR', str(BASE_DIR / 'output'))
 MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', 64 * 1024 * 1024))
-ALLOWED_EXTENSIONS = set(
+ALLOWED_EXTENSIONS = frozenset(
     ext.strip().lower() for ext in os.getenv('ALLOWED_EXTENSIONS', 'pdf').split(',') if ext.strip()
 )
+# Per-worker LRU of single-PDF results keyed by content hash (0 disables)
+RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', '128'))
+# Re-extracting a PDF of the same name overwrites its artifacts, so downloads
+# default to no-cache; clients still revalidate via ETag for a cheap 304
+DOWNLOAD_MAX_AGE_SECONDS = int(os.getenv('DOWNLOAD_MAX_AGE_SECONDS', '0'))
+# Let Apache/lighttpd serve downloads via the X-Sendfile header
+USE_X_SENDFILE = os.getenv('USE_X_SENDFILE', 'false').lower() == 'true'
+# When set (e.g. '/_protected/'), downloads are handed to nginx via X-Accel-Redirect
+DOWNLOAD_ACCEL_REDIRECT_PREFIX = os.getenv('DOWNLOAD_ACCEL_REDIRECT_PREFIX', '')
+
+# Optional Flask extensions (imported only when enabled)
+ENABLE_RATE_LIMIT = os.getenv('ENABLE_RATE_LIMIT', 'true').lower() == 'true'
+ENABLE_SWAGGER_UI = os.getenv('ENABLE_SWAGGER_UI', 'true').lower() == 'true'
+
+# Rate limiting configuration
+RATELIMIT_DEFAULTS = [
+    limit.strip() for limit in os.getenv('RATELIMIT_DEFAULTS', '2000 per hour;1000 per minute').split(';') if limit.strip()
+]
+RATELIMIT_STORAGE_URI = os.getenv('RATELIMIT_STORAGE_URI', 'memory://')
+RATELIMIT_STRATEGY = os.getenv('RATELIMIT_STRATEGY', 'fixed-window')
 
 # Cleanup configuration
 ENABLE_CLEANUP = os.getenv('ENABLE_CLEANUP', 'true').lower() == 'true'
@@ -1,149 +1,337 @@
 import subprocess
 import os
 import logging
+import shutil
+import tempfile
+import threading
 import time
 import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Union
-from .config import PDF_FIGURES2_JAR, PDF_FIGURES2_CWD, DEFAULT_DPI, JAVA_OPTS, PDFFIGURES2_TIMEOUT
-from .metadata import parse_json_metadata_from_dict
+from typing import List, Dict, Any, Optional, Tuple, Union
+from .config import (
+    PDF_FIGURES2_JAR, PDF_FIGURES2_CWD, DEFAULT_DPI, JAVA_OPTS, PDFFIGURES2_TIMEOUT,
+    PDFFIGURES2_BATCH_WORKERS, PDFFIGURES2_CDS_ARCHIVE, PDFFIGURES2_CONCURRENCY,
+    PDFFIGURES2_SINGLE_JAVA_OPTS, PDFFIGURES2_BATCH_JAVA_OPTS, PDFFIGURES2_LEGACY_CMM,
+)
+from .metadata import parse_json_metadata_from_dict, read_json_file
 
 logger = logging.getLogger(__name__)
 
+_cds_options: Optional[Tuple[str, ...]] = None
+
+# How much of a failed run's stderr is kept for the error message
+_STDERR_TAIL_BYTES = 16 * 1024
+
+# Threads used to read per-document metadata files after a batch run
+_METADATA_READ_WORKERS = 8
+
+# Bounds concurrent JVMs so parallel requests and batch shards don't
+# oversubscribe the CPUs (and the JAVA_OPTS heap of each JVM)
+_jvm_slots = threading.BoundedSemaphore(PDFFIGURES2_CONCURRENCY)
+
+# Matches JVM collector selection flags such as -XX:+UseG1GC
+_GC_FLAG_RE = re.compile(r'^-XX:\+Use\w*GC$')
+
+
+def _mode_java_opts(mode_opts: List[str], java_opts: List[str]) -> List[str]:
+    """Drop per-mode GC flags when JAVA_OPTS already picks a collector.
+
+    The JVM refuses to start when more than one collector is selected.
+    """
+    if any(_GC_FLAG_RE.match(opt) for opt in java_opts):
+        return [opt for opt in mode_opts if not _GC_FLAG_RE.match(opt)]
+    return mode_opts
+
+
+# Constant parts of the pdffigures2 command line, built once at import.
+# JAVA_OPTS may hold several flags, so it is split into separate arguments.
+_JAVA_OPTS = JAVA_OPTS.split()
+_CMD_PREFIX_SINGLE = ('java', *_JAVA_OPTS, *_mode_java_opts(PDFFIGURES2_SINGLE_JAVA_OPTS, _JAVA_OPTS))
+_CMD_PREFIX_BATCH = ('java', *_JAVA_OPTS, *_mode_java_opts(PDFFIGURES2_BATCH_JAVA_OPTS, _JAVA_OPTS))
+_CMD_JAR = (
+    *(('-Dsun.java2d.cmm=sun.java2d.cmm.kcms.KcmsServiceProvider',) if PDFFIGURES2_LEGACY_CMM else ()),
+    '-jar', PDF_FIGURES2_JAR,
+)
+
+# Per-call slots in the command templates, counted from the end:
+#   single: ... <input> -m <out> -d <out> --dpi <dpi>
+#   batch:  ... <input> -s <stat> -m <out> -d <out> --dpi <dpi>
+_SLOT = ''
+_IDX_SINGLE_INPUT = -7
+_IDX_BATCH_INPUT = -9
+_IDX_BATCH_STAT = -7
+_IDX_OUT_M = -5
+_IDX_OUT_D = -3
+
+def _get_cds_options() -> Tuple[str, ...]:
+    """JVM flags that map the AppCDS archive, or () when none is available.
+
+    Class data sharing lets each pdffigures2 JVM map pre-parsed class
+    metadata instead of loading it from the jar, which shortens startup.
+    A found archive is cached; a missing one is re-checked on each call.
+    """
+    global _cds_options
+    if _cds_options is None:
+        if PDFFIGURES2_CDS_ARCHIVE and os.path.isfile(PDFFIGURES2_CDS_ARCHIVE):
+            _cds_options = (f'-XX:SharedArchiveFile={PDFFIGURES2_CDS_ARCHIVE}', '-Xshare:auto')
+        else:
+            return ()
+    return _cds_options
+
+@lru_cache(maxsize=2)
+def _command_templates(cds_options: Tuple[str, ...]) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """Return the (single, batch) command templates for the given CDS flags."""
+    single = (
+        *_CMD_PREFIX_SINGLE, *cds_options, *_CMD_JAR,
+        _SLOT, '-m', _SLOT, '-d', _SLOT, '--dpi', DEFAULT_DPI,
+    )
+    batch = (
+        *_CMD_PREFIX_BATCH, *cds_options, *_CMD_JAR,
+        _SLOT, '-s', _SLOT, '-m', _SLOT, '-d', _SLOT, '--dpi', DEFAULT_DPI,
+    )
+    return single, batch
+
 def _build_pdffigures2_command(
-    input_path: Union[str, Path],
-    output_dir: Union[str, Path],
-    stat_file: Optional[Union[str, Path]] = None,
+    input_path: str,
+    output_dir: str,
+    stat_file: Optional[str] = None,
     batch: bool = False,
 ) -> List[str]:
-    """Build the pdffigures2 command for single-file or batch processing."""
-    input_path = Path(input_path).resolve()
-    output_dir = Path(output_dir).resolve()
-    
-    # CRITICAL: pdffigures2 requires trailing slash for directories
-    output_dir_str = str(output_dir) + os.sep
-
-    cmd: List[str] = [
-        'java',
-        JAVA_OPTS,
-        '-Dsun.java2d.cmm=sun.java2d.cmm.kcms.KcmsServiceProvider',
-        '-jar', PDF_FIGURES2_JAR,
-        str(input_path),
-    ]
+    """Build the pdffigures2 command for single-file or batch processing.
 
+    Paths must already be absolute; callers resolve them once and pass
+    output_dir with its trailing separator, which pdffigures2 requires.
+    """
+    single_template, batch_template = _command_templates(_get_cds_options())
     if batch and stat_file is not None:
-        stat_file = Path(stat_file).resolve()
-        cmd.extend([
-            '-s', str(stat_file),
-            '-m', output_dir_str,
-            '-d', output_dir_str,
-            '--dpi', DEFAULT_DPI,
-        ])
+        cmd = list(batch_template)
+        cmd[_IDX_BATCH_INPUT] = input_path
+        cmd[_IDX_BATCH_STAT] = stat_file
     else:
-        cmd.extend([
-            '-m', output_dir_str,
-            '-d', output_dir_str,
-            '--dpi', DEFAULT_DPI,
-        ])
-
+        cmd = list(single_template)
+        cmd[_IDX_SINGLE_INPUT] = input_path
+    cmd[_IDX_OUT_M] = output_dir
+    cmd[_IDX_OUT_D] = output_dir
     return cmd
 
+def _run_command(command: List[str]) -> subprocess.CompletedProcess:
+    """Run a pdffigures2 command once a JVM slot is free.
+
+    stderr goes to an unlinked temp file rather than a pipe, so a chatty
+    run doesn't accumulate in memory; on failure only its last
+    _STDERR_TAIL_BYTES are read back into the result's stderr.
+    """
+    with _jvm_slots, tempfile.TemporaryFile() as stderr_file:
+        result = subprocess.run(
+            command,
+            # stdout is progress chatter; only stderr is kept for errors
+            stdout=subprocess.DEVNULL,
+            stderr=stderr_file,
+            cwd=PDF_FIGURES2_CWD if os.path.exists(PDF_FIGURES2_CWD) else None,
+            timeout=PDFFIGURES2_TIMEOUT,
+        )
+        stderr = b''
+        if result.returncode != 0:
+            size = stderr_file.seek(0, os.SEEK_END)
+            stderr_file.seek(max(0, size - _STDERR_TAIL_BYTES))
+            stderr = stderr_file.read()
+    return subprocess.CompletedProcess(command, result.returncode, None, stderr)
+
 def run_pdffigures2(file_path: Union[str, Path], output_dir: Union[str, Path]) -> Dict[str, Any]:
     """Run pdffigures2 on a single PDF and return parsed metadata."""
-    file_path = Path(file_path)
+    file_path = Path(file_path).resolve()
     output_dir = Path(output_dir).resolve()
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    command = _build_pdffigures2_command(file_path, output_dir, batch=False)
-    logger.debug(f"Running pdffigures2: {' '.join(command)}")
+    # CRITICAL: pdffigures2 requires trailing slash for directories
+    command = _build_pdffigures2_command(str(file_path), f"{output_dir}{os.sep}", batch=False)
+    logger.debug("Running pdffigures2: %s (cwd=%s)", command, PDF_FIGURES2_CWD)
 
     start_time = time.time()
     try:
-        result = subprocess.run(
-            command,
-            capture_output=True,
-            text=True,
-            cwd=PDF_FIGURES2_CWD if os.path.exists(PDF_FIGURES2_CWD) else None,
-            timeout=PDFFIGURES2_TIMEOUT,
-        )
+        result = _run_command(command)
     except subprocess.TimeoutExpired as e:
-        logger.error(f"pdffigures2 timed out for {file_path}")
+        logger.error("pdffigures2 timed out for %s", file_path)
         raise RuntimeError(f"pdffigures2 timed out for {file_path.name}") from e
 
     end_time = time.time()
 
     if result.returncode != 0:
-        logger.error(f"pdffigures2 failed: {result.stderr}")
-        raise RuntimeError(f"pdffigures2 failed: {result.stderr}")
+        stderr = result.stderr.decode('utf-8', 'replace')
+        logger.error("pdffigures2 failed: %s", stderr)
+        raise RuntimeError(f"pdffigures2 failed: {stderr}")
 
     processing_time_ms = int((end_time - start_time) * 1000)
     
     base_filename = file_path.stem
     metadata_path = output_dir / f"{base_filename}.json"
 
-    if not metadata_path.exists():
-        logger.error(f"Metadata file not found: {metadata_path}")
+    try:
+        metadata = read_json_file(metadata_path, expect_array=True)
+    except FileNotFoundError:
+        logger.error("Metadata file not found: %s", metadata_path)
         return {"error": "Metadata file not found"}
+    except ValueError as e:
+        logger.error("Invalid metadata file %s: %s", metadata_path, e)
+        raise RuntimeError(f"Invalid metadata file {metadata_path.name}") from e
 
-    with open(metadata_path, 'r', encoding='utf-8') as f:
-        metadata = json.load(f)
-
-    parsed = parse_json_metadata_from_dict(metadata, processing_time=processing_time_ms, filename=base_filename)
+    parsed = parse_json_metadata_from_dict(
+        metadata, processing_time=processing_time_ms, filename=base_filename, inplace=True
+    )
     parsed["metadata_filename"] = metadata_path.name
     
     return parsed
 
-def run_pdffigures2_batch(folder_path: Union[str, Path], output_dir: Union[str, Path]) -> List[Dict[str, Any]]:
-    """Run pdffigures2 batch processing on a directory of PDFs."""
+def _run_batch_command(folder_path: Path, output_dir: Path, stat_file: Path) -> None:
+    """Run a single pdffigures2 batch JVM over folder_path, raising on failure."""
+    # For batch mode, pdffigures2 expects directories to end with /
+    command = _build_pdffigures2_command(
+        f"{folder_path}{os.sep}", f"{output_dir}{os.sep}", stat_file=str(stat_file), batch=True
+    )
+
+    logger.debug("Running pdffigures2 batch: %s (cwd=%s)", command, PDF_FIGURES2_CWD)
+    result = _run_command(command)
+
+    if result.returncode != 0:
+        stderr = result.stderr.decode('utf-8', 'replace')
+        logger.error("pdffigures2 batch failed: %s", stderr)
+        raise RuntimeError(f"pdffigures2 batch failed: {stderr}")
+
+def _run_sharded_batch(pdfs: List[Path], output_dir: Path, stat_file: Path, workers: int) -> None:
+    """Split pdfs across `workers` directories and run one JVM per shard concurrently.
+
+    The JVMs do the work in separate processes, so threads are enough to
+    drive them. Per-shard stat files are merged into `stat_file`.
+    """
+    shard_root = Path(tempfile.mkdtemp(prefix='pdffigures2-shards-'))
+    try:
+        shards = [shard_root / f"shard-{i}" for i in range(workers)]
+        for shard in shards:
+            shard.mkdir()
+        for i, pdf in enumerate(pdfs):
+            link = shards[i % workers] / pdf.name
+            try:
+                link.symlink_to(pdf)
+            except OSError:
+                shutil.copy2(pdf, link)
+
+        logger.debug("Sharding %d PDFs across %d pdffigures2 workers", len(pdfs), workers)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_run_batch_command, shard, output_dir, shard / 'stat_file.json')
+                for shard in shards
+            ]
+            # Wait for every shard before failing so no JVM outlives the
+            # shard directory, then fail the whole batch like the unsharded
+            # path does rather than return a result with PDFs missing.
+            errors = []
+            failed: List[str] = []
+            for shard, future in zip(shards, futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error("pdffigures2 shard %s failed: %s", shard.name, e)
+                    errors.append(e)
+                    failed.extend(sorted(p.name for p in shard.iterdir() if p.name != 'stat_file.json'))
+            if errors:
+                raise RuntimeError(
+                    f"pdffigures2 failed on {len(errors)} of {len(shards)} shards "
+                    f"({', '.join(failed)}): {errors[0]}"
+                ) from errors[0]
+
+        stats: List[Dict[str, Any]] = []
+        for shard in shards:
+            shard_stat_file = shard / 'stat_file.json'
+            if shard_stat_file.exists():
+                stats.extend(read_json_file(shard_stat_file))
+        # Shard paths differ per run, so order by the PDF name to keep the
+        # output independent of PDFFIGURES2_BATCH_WORKERS.
+        stats.sort(key=lambda stat: os.path.basename(stat.get('filename', '')))
+
+        with open(stat_file, 'w', encoding='utf-8') as f:
+            json.dump(stats, f)
+    finally:
+        shutil.rmtree(shard_root, ignore_errors=True)
+
+def _load_batch_summary(output_dir: str, stat: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Load and parse the metadata for one stat entry, or None if it is missing.
+
+    A corrupt metadata file fails the batch, like a failed shard does.
+    """
+    # os.path string ops instead of Path objects: this runs once per batch entry
+    filename = stat.get('filename', '')
+    base_name = os.path.splitext(os.path.basename(filename))[0]
+    metadata_name = f"{base_name}.json"
+    metadata_path = os.path.join(output_dir, metadata_name)
+    
+    try:
+        metadata = read_json_file(metadata_path, expect_array=True)
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        logger.error("Invalid metadata file %s: %s", metadata_path, e)
+        raise RuntimeError(f"Invalid metadata file {metadata_name}") from e
+    parsed = parse_json_metadata_from_dict(
+        metadata, 
+        processing_time=stat.get('timeInMillis', 0), 
+        filename=base_name,
+        inplace=True,
+    )
+    parsed["metadata_filename"] = metadata_name
+    return parsed
+
+def run_pdffigures2_batch(
+    folder_path: Union[str, Path],
+    output_dir: Union[str, Path],
+    max_workers: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Run pdffigures2 batch processing on a directory of PDFs.
+
+    With more than one worker (PDFFIGURES2_BATCH_WORKERS or max_workers),
+    the PDFs are sharded across concurrent JVMs.
+    """
     folder_path = Path(folder_path).resolve()
     output_dir = Path(output_dir).resolve()
     output_dir.mkdir(parents=True, exist_ok=True)
     
     stat_file = output_dir / 'stat_file.json'
-    # For batch mode, pdffigures2 expects input directory to end with /
-    input_dir_str = str(folder_path) + os.sep
-
-    command = _build_pdffigures2_command(input_dir_str, output_dir, stat_file=stat_file, batch=True)
 
     try:
-        logger.debug(f"Running pdffigures2 batch: {' '.join(command)}")
-        result = subprocess.run(
-            command,
-            capture_output=True,
-            text=True,
-            cwd=PDF_FIGURES2_CWD if os.path.exists(PDF_FIGURES2_CWD) else None,
-            timeout=PDFFIGURES2_TIMEOUT,
-        )
-
-        if result.returncode != 0:
-            logger.error(f"pdffigures2 batch failed: {result.stderr}")
-            raise RuntimeError(f"pdffigures2 batch failed: {result.stderr}")
+        workers = max_workers or PDFFIGURES2_BATCH_WORKERS
+        if workers > 1:
+            # scandir's d_type answers is_file() without a stat per entry
+            with os.scandir(folder_path) as entries:
+                pdfs = sorted(
+                    Path(entry.path) for entry in entries
+                    if entry.name.endswith('.pdf') and entry.is_file()
+                )
+            workers = min(workers, len(pdfs))
+        if workers > 1:
+            _run_sharded_batch(pdfs, output_dir, stat_file, workers)
+        else:
+            _run_batch_command(folder_path, output_dir, stat_file)
 
         if not stat_file.exists():
             return []
 
-        with open(stat_file, 'r', encoding='utf-8') as f:
-            stats = json.load(f)
-
-        summaries = []
-        for stat in stats:
-            filename = stat.get('filename', '')
-            base_name = Path(filename).stem
-            metadata_path = output_dir / f"{base_name}.json"
-            
-            if metadata_path.exists():
-                with open(metadata_path, 'r', encoding='utf-8') as f:
-                    metadata = json.load(f)
-                parsed = parse_json_metadata_from_dict(
-                    metadata, 
-                    processing_time=stat.get('timeInMillis', 0), 
-                    filename=base_name
-                )
-                parsed["metadata_filename"] = metadata_path.name
-                summaries.append(parsed)
+        stats = read_json_file(stat_file)
+
+        output_dir_str = os.fspath(output_dir)
+        if len(stats) > 1:
+            with ThreadPoolExecutor(
+                max_workers=min(_METADATA_READ_WORKERS, len(stats))
+            ) as executor:
+                loaded = list(executor.map(lambda stat: _load_batch_summary(output_dir_str, stat), stats))
+        else:
+            loaded = [_load_batch_summary(output_dir_str, stat) for stat in stats]
+
+        summaries = [parsed for parsed in loaded if parsed is not None]
         
         return summaries
 
     except Exception as e:
-        logger.error(f"Failed to run pdffigures2 batch: {e}")
+        logger.error("Failed to run pdffigures2 batch: %s", e)
         raise
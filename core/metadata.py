@@ -11,17 +11,41 @@ import logging
 import os
 from typing import Any, Dict, List, Optional
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional for core/
+    orjson = None
+
+
+def read_json_file(path: str, *, expect_array: bool = False) -> Any:
+    """Read and decode a JSON file, using orjson when it is installed.
+
+    With expect_array=True the first non-whitespace byte is checked before
+    decoding, so a file that isn't a JSON array raises ValueError without
+    being parsed.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if expect_array and not data.lstrip()[:1] == b"[":
+        raise ValueError(f"{path} does not contain a JSON array")
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
 
 def parse_json_metadata_from_dict(
     metadata: List[Dict[str, Any]],
     *,
     processing_time: int = 0,
     filename: Optional[str] = None,
+    inplace: bool = False,
 ) -> Dict[str, Any]:
     """Parse in-memory pdffigures2 JSON list into a summary dict.
 
     This mirrors the structure previously built in app.service.parse_json_metadata,
-    but operates on an already-loaded list of dicts.
+    but operates on an already-loaded list of dicts. With inplace=True the
+    records are reused (their renderURL is rewritten) instead of copied,
+    for callers that own a freshly loaded list.
     """
     if not isinstance(metadata, list):
         logging.error("parse_json_metadata_from_dict expected a list of objects")
@@ -29,22 +53,29 @@ def parse_json_metadata_from_dict(
 
     figures = []
     tables = []
+    pages_seen = set()
+    add_page = pages_seen.add
+    basename = os.path.basename
 
+    # Single pass: pages count every record, including ones without an image
     for fig in metadata:
-        if not fig.get("renderURL"):
+        add_page(fig.get("page", 0))
+        render_url = fig.get("renderURL")
+        if not render_url:
             continue
 
-        # Create a copy with sanitized filename for the URL
-        item = fig.copy()
-        item["renderURL"] = os.path.basename(item["renderURL"])
+        # Sanitize the filename for the URL, on a copy unless the caller owns the list
+        item = fig if inplace else fig.copy()
+        item["renderURL"] = basename(render_url)
 
-        if fig.get("figType") == "Figure":
+        fig_type = fig.get("figType")
+        if fig_type == "Figure":
             figures.append(item)
-        elif fig.get("figType") == "Table":
+        elif fig_type == "Table":
             tables.append(item)
 
     doc_name = filename or "document"
-    pages = len({fig.get("page", 0) for fig in metadata})
+    pages = len(pages_seen)
 
     return {
         "document": doc_name,
@@ -69,14 +100,12 @@ def load_and_parse_metadata_file(
     This is a pure helper that does not depend on Flask or subprocess.
     It is safe to use from both the web service and the CLI.
     """
-    if not os.path.exists(metadata_path):
+    try:
+        metadata = read_json_file(metadata_path, expect_array=True)
+    except FileNotFoundError:
         logging.error("Metadata file not found: %s", metadata_path)
         return {"error": "Metadata file not found"}
-
-    try:
-        with open(metadata_path, "r", encoding="utf-8") as f:
-            metadata = json.load(f)
-    except (OSError, json.JSONDecodeError) as exc:
+    except (OSError, ValueError) as exc:
         logging.error("Failed to load or parse metadata file %s: %s", metadata_path, exc)
         return {"error": "Invalid metadata file"}
 
@@ -85,6 +114,7 @@ def load_and_parse_metadata_file(
         metadata,
         processing_time=processing_time,
         filename=doc_name,
+        inplace=True,
     )
 
 
@@ -1,12 +1,15 @@
 import argparse
 import os
+import shutil
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import tempfile
 import zipfile
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from urllib.parse import urljoin
 from typing import List, Dict, Any, Optional
 
 # Try to import core modules for local mode
@@ -17,23 +20,57 @@ try:
 except ImportError:
     CORE_AVAILABLE = False
 
-# Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 DEFAULT_API_URL = "http://localhost:5001"
+# Copy buffer for streamed downloads; larger chunks mean fewer Python-level loop trips
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Concurrent result downloads; kept within the session's connection pool
+DOWNLOAD_WORKERS = 16
+HTTP_POOL_SIZE = 32
+# Batch archives up to this size are built in memory instead of a temp file
+ZIP_SPOOL_MAX_SIZE = 64 * 1024 * 1024
+# (connect, read) timeouts in seconds. Extraction waits on pdffigures2, so its
+# read timeout matches the server's 600s gunicorn timeout.
+DOWNLOAD_TIMEOUT = (5, 60)
+EXTRACT_TIMEOUT = (5, 600)
+
+def _iter_pdfs(folder_path: str, prefix: str = ''):
+    """Yield (path, archive name) for every PDF under folder_path, recursively.
+
+    os.scandir's entries carry the file type from the directory listing, so
+    the walk needs no per-file stat, and archive names are built by
+    concatenation instead of os.path.relpath.
+    """
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _iter_pdfs(entry.path, f"{prefix}{entry.name}/")
+            elif entry.name.lower().endswith('.pdf') and entry.is_file():
+                yield entry.path, prefix + entry.name
 
 class RemoteExtractor:
     def __init__(self, base_url: str = DEFAULT_API_URL):
         self.base_url = base_url.rstrip('/')
+        self.download_base = f"{self.base_url}/download/"
+        # One session so uploads and downloads reuse keep-alive connections.
+        # Retry only covers idempotent requests (downloads), never the POSTs.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=HTTP_POOL_SIZE,
+            pool_maxsize=HTTP_POOL_SIZE,
+            max_retries=Retry(total=3, backoff_factor=0.3),
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
 
     def extract_file(self, file_path: str, output_dir: str) -> Dict[str, Any]:
         url = f"{self.base_url}/extract"
-        logger.info(f"Sending {file_path} to {url}")
+        logger.info("Sending %s to %s", file_path, url)
         
         with open(file_path, 'rb') as f:
             files = {'file': f}
-            response = requests.post(url, files=files)
+            response = self.session.post(url, files=files, timeout=EXTRACT_TIMEOUT)
         
         response.raise_for_status()
         data = response.json()
@@ -42,62 +79,64 @@ class RemoteExtractor:
             raise RuntimeError(f"API Error: {data.get('error', {}).get('message', 'Unknown error')}")
         
         extraction_data = data['data']
-        self._download_results(extraction_data, output_dir)
+        self._download_results([extraction_data], output_dir)
         return extraction_data
 
     def extract_batch(self, folder_path: str, output_dir: str) -> List[Dict[str, Any]]:
         url = f"{self.base_url}/extract_batch"
-        logger.info(f"Sending batch from {folder_path} to {url}")
+        logger.info("Sending batch from %s to %s", folder_path, url)
         
-        temp_zip = tempfile.NamedTemporaryFile(delete=False, suffix='.zip')
-        try:
-            with zipfile.ZipFile(temp_zip, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for root, _, files in os.walk(folder_path):
-                    for file in files:
-                        if file.lower().endswith('.pdf'):
-                            zipf.write(os.path.join(root, file), os.path.relpath(os.path.join(root, file), folder_path))
-            
-            with open(temp_zip.name, 'rb') as f:
-                files = {'folder': ('batch.zip', f, 'application/zip')}
-                response = requests.post(url, files=files)
-            
-            response.raise_for_status()
-            data = response.json()
+        # Build the archive in memory, spilling to disk only for large batches.
+        # PDFs are already Flate-compressed, so members are stored, not deflated.
+        with tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_MAX_SIZE) as temp_zip:
+            with zipfile.ZipFile(temp_zip, 'w', zipfile.ZIP_STORED) as zipf:
+                for pdf_path, arcname in _iter_pdfs(folder_path):
+                    zipf.write(pdf_path, arcname)
             
-            if not data.get('success'):
-                raise RuntimeError(f"API Error: {data.get('error', {}).get('message', 'Unknown error')}")
-            
-            documents = data['data']
-            for doc in documents:
-                self._download_results(doc, output_dir)
-            return documents
-        finally:
-            if os.path.exists(temp_zip.name):
-                os.unlink(temp_zip.name)
+            temp_zip.seek(0)
+            files = {'folder': ('batch.zip', temp_zip, 'application/zip')}
+            response = self.session.post(url, files=files, timeout=EXTRACT_TIMEOUT)
+        
+        response.raise_for_status()
+        data = response.json()
+        
+        if not data.get('success'):
+            raise RuntimeError(f"API Error: {data.get('error', {}).get('message', 'Unknown error')}")
+        
+        documents = data['data']
+        self._download_results(documents, output_dir)
+        return documents
 
-    def _download_results(self, doc_data: Dict[str, Any], output_dir: str):
+    def _download_results(self, documents: List[Dict[str, Any]], output_dir: str):
         os.makedirs(output_dir, exist_ok=True)
         
-        # Download metadata
-        metadata_filename = doc_data['metadata_filename']
-        self._download_file(f"download/{metadata_filename}", os.path.join(output_dir, metadata_filename))
+        # One flat list of files (metadata, figures, tables) across all documents
+        basename = os.path.basename
+        filenames = [
+            name
+            for doc in documents
+            for name in (
+                doc['metadata_filename'],
+                *(basename(item['renderURL']) if isinstance(item, dict) else basename(item)
+                  for item in doc.get('figures', []) + doc.get('tables', [])),
+            )
+        ]
         
-        # Download figures and tables
-        for fig in doc_data.get('figures', []):
-            filename = os.path.basename(fig['renderURL']) if isinstance(fig, dict) else os.path.basename(fig)
-            self._download_file(f"download/{filename}", os.path.join(output_dir, filename))
-            
-        for tab in doc_data.get('tables', []):
-            filename = os.path.basename(tab['renderURL']) if isinstance(tab, dict) else os.path.basename(tab)
-            self._download_file(f"download/{filename}", os.path.join(output_dir, filename))
+        # Downloads are latency-bound, so overlap them on a few threads
+        download_base = self.download_base
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+            list(executor.map(
+                lambda filename: self._download_file(download_base + filename, os.path.join(output_dir, filename)),
+                filenames,
+            ))
 
-    def _download_file(self, path: str, output_path: str):
-        url = urljoin(self.base_url + '/', path)
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        with open(output_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+    def _download_file(self, url: str, output_path: str):
+        with self.session.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+            response.raise_for_status()
+            # Copy straight from the raw stream, still undoing any Content-Encoding
+            response.raw.decode_content = True
+            with open(output_path, 'wb') as f:
+                shutil.copyfileobj(response.raw, f, DOWNLOAD_CHUNK_SIZE)
 
 def main():
     parser = argparse.ArgumentParser(description="Extract figures and tables from PDF documents.")
@@ -108,6 +147,13 @@ def main():
     
     args = parser.parse_args()
     
+    # Configured here rather than at import so importing RemoteExtractor
+    # doesn't reconfigure the caller's logging
+    logging.basicConfig(
+        level=getattr(logging, os.getenv('LOG_LEVEL', 'INFO').upper(), logging.INFO),
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    
     input_path = Path(args.input)
     output_dir = Path(args.output_dir)
     
@@ -137,7 +183,7 @@ def main():
                 print(f"❌ Input path {input_path} not found.")
                 
     except Exception as e:
-        logger.error(f"Extraction failed: {e}")
+        logger.error("Extraction failed: %s", e)
         if not args.local:
             logger.info("Try running with --local if you have pdffigures2 installed locally.")
 
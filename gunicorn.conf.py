@@ -0,0 +1,17 @@
+"""Gunicorn configuration for the Figure Extractor API.
+
+Usage:
+    gunicorn -c gunicorn.conf.py run:app
+"""
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5001')
+
+# pdffigures2 runs in a blocking JVM subprocess, so plain sync workers are
+# enough. A single worker serializes heavy jobs: batch stat files and upload
+# paths are shared between requests, and the JVM limit
+# (PDFFIGURES2_CONCURRENCY) and cleanup thread are per process, so more
+# workers are not safe yet.
+worker_class = 'sync'
+workers = int(os.getenv('GUNICORN_WORKERS', '1'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '600'))